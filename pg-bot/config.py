@@ -12,6 +12,8 @@ def get_client():
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL")
 COMPLETION_MODEL = os.getenv("OPENAI_COMPLETION_MODEL")
+# sqlite file that persists embeddings between runs
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", ".embed_cache.sqlite")
 
 # Configure for Neon database API
 DATABASE_URL = os.getenv("NEON_DATABASE_URL")
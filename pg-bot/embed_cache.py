@@ -0,0 +1,113 @@
+# File: embed_cache.py
+#
+# Description:
+# ------------------------------------------------------------
+# A persistent, content-addressed cache of OpenAI embeddings stored in sqlite.
+# Entries are keyed by sha256(model + "\0" + text), so the same text embedded
+# with the same model is only ever sent to the API once. The least recently
+# used entries are evicted once the cache holds more than `capacity` rows.
+
+
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+def text_hash(text, model):
+    """Cache key for a text embedded with the given model"""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """sqlite-backed embedding store shared by every caller in the process
+
+    Args:
+        path (str): sqlite file to keep the cache in
+        capacity (int): maximum number of embeddings kept
+    """
+
+    def __init__(self, path=".embed_cache.sqlite", capacity=10_000):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        # Streamlit serves sessions from several threads; the lock
+        # serializes access to the one connection
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    text_hash TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS embeddings_last_used_idx
+                ON embeddings (last_used)
+            """)
+
+    def get_many(self, texts, model):
+        """Cached embeddings for texts, with None for each miss"""
+        keys = [text_hash(text, model) for text in texts]
+        found = {}
+        with self._lock, self._conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT text_hash, vector FROM embeddings "
+                    f"WHERE text_hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                found.update(rows)
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE text_hash = ?",
+                [(time.time(), key) for key in found],
+            )
+        return [
+            np.frombuffer(found[key], dtype=np.float32).tolist()
+            if key in found else None
+            for key in keys
+        ]
+
+    def put_many(self, texts, model, vectors):
+        """Store the embeddings of texts, evicting the least recently used"""
+        now = time.time()
+        rows = [
+            (text_hash(text, model), model,
+             np.asarray(vector, dtype=np.float32).tobytes(), now, now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute("""
+                DELETE FROM embeddings WHERE text_hash IN (
+                    SELECT text_hash FROM embeddings
+                    ORDER BY last_used DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (self.capacity,))
+
+    def embed_batch(self, texts, model, inner):
+        """Embeddings for texts, calling inner(misses, model) only on misses
+
+        Args:
+            texts (list): strings to embed
+            model (str): embedding model name, part of the cache key
+            inner (callable): takes (texts, model) and returns embeddings
+        Returns:
+            embeddings (list): one embedding per input string, in input order
+        """
+        embeddings = self.get_many(texts, model)
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if misses:
+            miss_texts = [texts[i] for i in misses]
+            new_embeddings = inner(miss_texts, model)
+            self.put_many(miss_texts, model, new_embeddings)
+            for i, embedding in zip(misses, new_embeddings):
+                embeddings[i] = list(embedding)
+        return embeddings
@@ -12,16 +12,26 @@
 # manuals project which stores chunks and data regarding nanofab tool manuals
 
 
+import io
 import os
+import struct
 import sys
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import connection as _connection
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 from pgvector.psycopg2 import register_vector
 import numpy as np
+import pandas as pd
 
-# Ensure the src directory is in the Python path to import the config module
-src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
-if src_path not in sys.path:
-    sys.path.append(src_path)
+# Ensure config resolves to the config.py next to this module, ahead of any
+# other module named config on the path
+module_path = os.path.dirname(os.path.abspath(__file__))
+if module_path not in sys.path:
+    sys.path.insert(0, module_path)
 
 from config import DATABASE_URL
 ########################################################################
@@ -33,6 +43,116 @@ def connect_db():
     return conn
 
 
+# Pool of open connections shared by the app so each query does not pay for
+# a new TCP/TLS handshake. Created on first use so importing stays cheap.
+_POOL = None
+_POOL_LOCK = threading.Lock()
+_MAX_CONNECTIONS = 10
+# getconn() raises at once when every connection is borrowed, so borrowers
+# queue on this semaphore for up to _CONNECTION_WAIT seconds instead
+_CONNECTION_SLOTS = threading.BoundedSemaphore(_MAX_CONNECTIONS)
+_CONNECTION_WAIT = 5
+_VECTOR_REGISTERED = False
+
+
+class PreparedConnection(_connection):
+    """Connection that remembers which statements it has PREPAREd
+
+    The record lives and dies with the connection, so a connection the pool
+    closes and replaces never inherits another one's prepared statements.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def _get_pool():
+    """Return the module connection pool, creating it if needed."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None or _POOL.closed:
+            _POOL = ThreadedConnectionPool(
+                minconn=2, maxconn=_MAX_CONNECTIONS, dsn=DATABASE_URL,
+                connection_factory=PreparedConnection,
+            )
+        return _POOL
+
+
+@contextmanager
+def get_conn():
+    """Borrow a connection from the pool, commit on success and return it.
+
+    When all connections are in use this waits up to _CONNECTION_WAIT
+    seconds for one to be returned, then raises PoolError. The pgvector types
+    are registered globally the first time a connection is handed out, so
+    later connections do not repeat the lookup.
+    """
+    global _VECTOR_REGISTERED
+    if not _CONNECTION_SLOTS.acquire(timeout=_CONNECTION_WAIT):
+        raise PoolError(
+            f"all {_MAX_CONNECTIONS} database connections stayed in use "
+            f"for {_CONNECTION_WAIT}s"
+        )
+    try:
+        pool = _get_pool()
+        conn = pool.getconn()
+    except Exception:
+        _CONNECTION_SLOTS.release()
+        raise
+    try:
+        if not _VECTOR_REGISTERED:
+            register_vector(conn, globally=True)
+            _VECTOR_REGISTERED = True
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                # the connection itself is broken; keep it out of the pool
+                conn.close()
+        raise
+    finally:
+        if pool.closed:
+            # the pool was closed while this connection was borrowed
+            conn.close()
+        else:
+            pool.putconn(conn, close=bool(conn.closed))
+        _CONNECTION_SLOTS.release()
+
+
+def ensure_connection():
+    """Open (or wake) a pooled connection so the next query starts warm."""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1")
+
+
+def _close_idle_connections():
+    """Close the pooled connections no thread is using so they reconnect.
+
+    After Neon suspends its compute every idle connection is dead too.
+    Connections other threads have borrowed are left alone; a broken one is
+    discarded by get_conn when it is returned.
+    """
+    pool = _POOL
+    if pool is None or pool.closed:
+        return
+    # ThreadedConnectionPool keeps its idle connections in _pool
+    with pool._lock:
+        idle, pool._pool = pool._pool, []
+    for conn in idle:
+        conn.close()
+
+
+def _prepare(cur, name, statement):
+    """PREPARE a statement once per connection; later calls are no-ops."""
+    if name not in cur.connection.prepared:
+        cur.execute(statement)
+        cur.connection.prepared.add(name)
+
+
 ########################################################################
 # Functions needed for creating and filling the table
 
@@ -44,37 +164,540 @@ def enable_pgvector_extension(cur):
     print("pgvector extension enabled")
 
 
+# Columns filled by insert_data_to_db besides the embedding. chunk_id is the
+# text id generated with the chunk, which element_chunk_junction and
+# chunk_kwds join on, so it is always supplied by the caller.
+_CHUNK_COLUMNS = (
+    'chunk_id', 'parent_type', 'parent_content', 'name_of_tool', 'content'
+)
+_COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+_COPY_TRAILER = struct.pack('>h', -1)
+
+
+def _pack_copy_row(texts, embedding_field):
+    """Encode one chunk_embeds row in the binary COPY format
+
+    Text fields are sent as UTF-8; embedding_field is the already packed
+    halfvec value (see _copy_chunks).
+    """
+    parts = [struct.pack('>h', len(texts) + 1)]
+    for text in texts:
+        # None, NaN, NaT and pd.NA are all written as NULL
+        if pd.isna(text):
+            parts.append(struct.pack('>i', -1))
+        else:
+            data = str(text).encode('utf-8')
+            parts.append(struct.pack('>i', len(data)))
+            parts.append(data)
+    parts.append(embedding_field)
+    return b''.join(parts)
+
+
+def _copy_chunks(cur, df, chunk_size, embeddings=None, table='chunk_embeds'):
+    """Stream the rows of df into table, chunk_size rows per COPY"""
+    copy_sql = sql.SQL(
+        "COPY {} ({}, embedding) FROM STDIN WITH (FORMAT BINARY)"
+    ).format(
+        sql.Identifier(table),
+        sql.SQL(', ').join(map(sql.Identifier, _CHUNK_COLUMNS)),
+    )
+    missing = [col for col in _CHUNK_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"DataFrame is missing the chunk columns {missing}")
+    if df['chunk_id'].isna().any():
+        raise ValueError("Every chunk needs a chunk_id")
+    # pull the columns out once instead of building a row object per chunk
+    rows = list(df[list(_CHUNK_COLUMNS)].itertuples(index=False, name=None))
+    if not rows:
+        print(f"no rows to copy into {table}")
+        return
+    if embeddings is None:
+        embeddings = df['embedding'].to_list()
+    # One contiguous (N, dim) matrix in pgvector's binary halfvec element
+    # format (big-endian fp16), converted in a single pass. Every field is
+    # then the same header followed by one row of the matrix.
+    vectors = np.ascontiguousarray(embeddings, dtype='>f2')
+    if vectors.ndim != 2 or len(vectors) != len(rows):
+        raise ValueError(
+            f"Expected {len(rows)} embeddings as an (N, dim) array, "
+            f"got shape {vectors.shape}"
+        )
+    dim = vectors.shape[1]
+    # field length, then the halfvec header: int16 dimensions, int16 unused
+    vector_header = struct.pack('>iHH', 4 + 2 * dim, dim, 0)
+    for start in range(0, len(rows), chunk_size):
+        stop = start + chunk_size
+        buf = io.BytesIO()
+        buf.write(_COPY_HEADER)
+        for texts, vector in zip(rows[start:stop], vectors[start:stop]):
+            buf.write(_pack_copy_row(texts, vector_header + vector.tobytes()))
+        buf.write(_COPY_TRAILER)
+        buf.seek(0)
+        cur.copy_expert(copy_sql, buf)
+    print(f"{len(df)} rows copied into {table}")
+
+
+def _upsert_chunks(cur, df, chunk_size, embeddings=None):
+    """Insert the chunks of df, updating the stored ones with the same chunk_id
+
+    The rows are COPYed into a temporary staging table and merged from there,
+    since COPY itself cannot resolve conflicts. Stored chunks whose columns
+    are all unchanged are left as they are.
+    """
+    cur.execute("""
+        CREATE TEMP TABLE chunk_embeds_staging
+        (LIKE chunk_embeds INCLUDING DEFAULTS)
+        ON COMMIT DROP;
+    """)
+    _copy_chunks(cur, df, chunk_size, embeddings, table='chunk_embeds_staging')
+    cols = _CHUNK_COLUMNS + ('embedding',)
+    updated = [col for col in cols if col != 'chunk_id']
+    cur.execute(sql.SQL("""
+        INSERT INTO chunk_embeds ({cols})
+        SELECT {cols} FROM chunk_embeds_staging
+        ON CONFLICT (chunk_id) DO UPDATE
+        SET ({updated}) = ROW({excluded})
+        WHERE ({stored}) IS DISTINCT FROM ({excluded});
+    """).format(
+        cols=sql.SQL(', ').join(map(sql.Identifier, cols)),
+        updated=sql.SQL(', ').join(map(sql.Identifier, updated)),
+        excluded=sql.SQL(', ').join(
+            sql.Identifier('excluded', col) for col in updated
+        ),
+        stored=sql.SQL(', ').join(
+            sql.Identifier('chunk_embeds', col) for col in updated
+        ),
+    ))
+    print(f"{cur.rowcount} chunks inserted or updated in chunk_embeds")
+
+
+def _require_halfvec_column(cur):
+    """Raise RuntimeError unless chunk_embeds.embedding is a halfvec column
+
+    The COPY format, the index operator class and the search statements all
+    assume halfvec. On a vector column COPY fails and every search casts
+    the column, so it can no longer use the index.
+    """
+    cur.execute("""
+        SELECT format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = 'chunk_embeds'::regclass AND attname = 'embedding';
+    """)
+    column_type = cur.fetchone()[0]
+    if not column_type.startswith('halfvec'):
+        raise RuntimeError(
+            f"chunk_embeds.embedding is {column_type}, but pg-bot reads and "
+            "writes halfvec; run neondb.convert_embeddings_to_halfvec() once "
+            "to migrate the column and rebuild its index"
+        )
+
+
+def _load_chunks(cur, df, chunk_size, embeddings=None, upsert=False):
+    """Load the chunks of df with a plain COPY, or merge them when upsert"""
+    if upsert:
+        _upsert_chunks(cur, df, chunk_size, embeddings)
+    else:
+        _copy_chunks(cur, df, chunk_size, embeddings)
+
+
+def insert_data_to_db(df, chunk_size=10_000, embeddings=None, upsert=False):
+    """Bulk load chunks into chunk_embeds with binary COPY
+
+    Any ANN index stays live during the load, so for large loads prefer
+    ingest_then_index.
+
+    Args:
+        df (DataFrame): one row per chunk with the chunk_id, parent_type,
+            parent_content, name_of_tool, content and embedding columns
+        chunk_size (int): number of rows sent per COPY
+        embeddings (ndarray): optional (N, 1536) matrix of the embeddings,
+            used instead of df's embedding column
+        upsert (bool): update the stored chunks that share a chunk_id with
+            df instead of failing on them, so re-ingesting a manual does not
+            duplicate it
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        _require_halfvec_column(cur)
+        _load_chunks(cur, df, chunk_size, embeddings, upsert)
+
+
+def get_number_of_records_in_table(table_name):
+    """Return the number of rows in the given table."""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            sql.SQL("SELECT COUNT(*) FROM {};").format(sql.Identifier(table_name))
+        )
+        num_records = cur.fetchone()[0]
+    return num_records
+
+
+def configure_ann_params(num_records, use_ivfflat=False):
+    """Choose ANN index parameters for a table of num_records rows
+
+    Args:
+        num_records (int): number of rows that will be indexed
+        use_ivfflat (bool): return IVFFlat parameters instead of HNSW
+    Returns:
+        params (dict): index type and the build/search parameters for it
+    """
+    if use_ivfflat:
+        if num_records <= 1_000_000:
+            num_lists = max(num_records // 1000, 1)
+        else:
+            num_lists = int(np.sqrt(num_records))
+        return {
+            "index": "ivfflat",
+            "lists": num_lists,
+            "probes": max(int(np.sqrt(num_lists)), 1),
+        }
+    if num_records < 100_000:
+        return {"index": "hnsw", "m": 16, "ef_construction": 64, "ef_search": 40}
+    if num_records <= 1_000_000:
+        return {"index": "hnsw", "m": 24, "ef_construction": 100, "ef_search": 100}
+    return {"index": "hnsw", "m": 32, "ef_construction": 128, "ef_search": 200}
+
+
+def _build_embedding_index(cur, params):
+    """Drop and recreate chunk_embeds_embedding_idx with the given params"""
+    cur.execute("SET LOCAL maintenance_work_mem = '2GB';")
+    cur.execute("SET LOCAL max_parallel_maintenance_workers = 7;")
+    cur.execute("DROP INDEX IF EXISTS chunk_embeds_embedding_idx;")
+    cur.execute("SELECT current_database();")
+    db_name = sql.Identifier(cur.fetchone()[0])
+    if params["index"] == "ivfflat":
+        cur.execute(f"""
+            CREATE INDEX chunk_embeds_embedding_idx
+            ON chunk_embeds
+            USING ivfflat (embedding halfvec_cosine_ops)
+            WITH (lists = {params['lists']});
+        """)
+        cur.execute(
+            sql.SQL("ALTER DATABASE {} SET ivfflat.probes = {}").format(
+                db_name, sql.Literal(params["probes"])
+            )
+        )
+    else:
+        cur.execute(f"""
+            CREATE INDEX chunk_embeds_embedding_idx
+            ON chunk_embeds
+            USING hnsw (embedding halfvec_cosine_ops)
+            WITH (m = {params['m']},
+                  ef_construction = {params['ef_construction']});
+        """)
+        cur.execute(
+            sql.SQL("ALTER DATABASE {} SET hnsw.ef_search = {}").format(
+                db_name, sql.Literal(params["ef_search"])
+            )
+        )
+
+
+def index_chunk_embeds_with_hnsw(use_ivfflat=False):
+    """(Re)build the ANN index on chunk_embeds.embedding
+
+    HNSW is the default as it gives better recall at a given query speed.
+    IVFFlat builds much faster, so it is kept for cold-start bulk loads.
+    Index parameters are sized to the current row count, and the matching
+    search parameter is stored as the database default. Top-k searches only
+    ever raise ef_search above that default.
+
+    Args:
+        use_ivfflat (bool): build an IVFFlat index instead of HNSW
+    Returns:
+        params (dict): the parameters the index was built with
+    """
+    params = configure_ann_params(
+        get_number_of_records_in_table('chunk_embeds'), use_ivfflat
+    )
+    with get_conn() as conn, conn.cursor() as cur:
+        _build_embedding_index(cur, params)
+    print(f"chunk_embeds embedding index created with {params}")
+    return params
+
+
+def ingest_then_index(df, use_ivfflat=False, chunk_size=10_000,
+                      embeddings=None, upsert=False):
+    """Bulk load chunks with the ANN index dropped, then rebuild it
+
+    Inserting into a live HNSW index costs a graph update per row, which is
+    far slower than building the index once over the loaded table. Runs in
+    a single transaction, so searches wait until the new index is built.
+
+    Args:
+        df (DataFrame): rows to load, as for insert_data_to_db
+        use_ivfflat (bool): rebuild as IVFFlat instead of HNSW
+        chunk_size (int): number of rows sent per COPY
+        embeddings (ndarray): optional (N, 1536) matrix, as for
+            insert_data_to_db
+        upsert (bool): update the stored chunks that share a chunk_id with
+            df, as for insert_data_to_db
+    Returns:
+        params (dict): the parameters the index was built with
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        _require_halfvec_column(cur)
+        cur.execute("DROP INDEX IF EXISTS chunk_embeds_embedding_idx;")
+        _load_chunks(cur, df, chunk_size, embeddings, upsert)
+        cur.execute("SELECT COUNT(*) FROM chunk_embeds;")
+        params = configure_ann_params(cur.fetchone()[0], use_ivfflat)
+        _build_embedding_index(cur, params)
+        cur.execute("ANALYZE chunk_embeds;")
+    print(f"chunk_embeds embedding index created with {params}")
+    return params
+
+
+def convert_embeddings_to_halfvec():
+    """Store chunk_embeds.embedding as halfvec(1536) and rebuild its index
+
+    Half precision halves the bytes read per candidate during a search with
+    negligible loss of recall. The ANN index is dropped first because its
+    operator class is tied to the column type, then rebuilt afterwards.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("DROP INDEX IF EXISTS chunk_embeds_embedding_idx;")
+        cur.execute("""
+            ALTER TABLE chunk_embeds
+            ALTER COLUMN embedding TYPE halfvec(1536)
+            USING embedding::halfvec(1536);
+        """)
+    print("chunk_embeds.embedding converted to halfvec(1536)")
+    # changing the column type resets its storage, so set it again
+    set_embedding_storage_plain()
+    return index_chunk_embeds_with_hnsw()
+
+
+def set_embedding_storage_plain():
+    """Keep chunk_embeds.embedding inline and uncompressed (no TOAST)
+
+    Searches then read each candidate vector straight from the heap page
+    instead of de-TOASTing it. A halfvec(1536) is about 3KB, so a row still
+    fits well inside an 8KB page. VACUUM FULL rewrites the existing rows and
+    cannot run inside a transaction, hence the autocommit switch.
+    """
+    with get_conn() as conn:
+        # registering pgvector on first use may have opened a transaction
+        conn.commit()
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    ALTER TABLE chunk_embeds
+                    ALTER COLUMN embedding SET STORAGE PLAIN;
+                """)
+                cur.execute("VACUUM FULL chunk_embeds;")
+        finally:
+            conn.autocommit = False
+    print("chunk_embeds.embedding storage set to PLAIN")
+
+
 
 ###############################################################################
 # This is used by the vector search nanobot Labnetwork page
 
-def get_top_k_similar_docs(query_embedding, k):
+# Columns a top-k search may return; the app only renders the content
+RESULT_COLUMNS = (
+    'chunk_id', 'parent_type', 'parent_content', 'name_of_tool', 'content'
+)
+DEFAULT_RESULT_COLUMNS = ('chunk_id', 'content')
+
+
+def _check_result_columns(cols):
+    """Raise ValueError if cols asks for a column outside RESULT_COLUMNS"""
+    unknown = [col for col in cols if col not in RESULT_COLUMNS]
+    if unknown:
+        raise ValueError(
+            f"Cannot return columns {unknown}; use any of {RESULT_COLUMNS}"
+        )
+
+
+def _topk_statement_name(cols):
+    """Prepared statement name for a top-k search returning cols"""
+    return "topk_" + "_".join(cols)
+
+
+def _topk_statement(name, cols):
+    """PREPARE statement for a top-k search returning cols
+
+    Prepared once per pooled connection so repeat searches skip parse and
+    plan; each column selection gets its own statement name.
+    """
+    return sql.SQL("""
+        PREPARE {name}(halfvec, int) AS
+        SELECT {cols}
+        FROM chunk_embeds
+        ORDER BY embedding <=> $1
+        LIMIT $2
+    """).format(
+        name=sql.Identifier(name),
+        cols=sql.SQL(', ').join(map(sql.Identifier, cols)),
+    )
+
+
+def _to_halfvec_literal(embedding):
+    """Text form of a query vector at the halfvec column's fp16 precision
+
+    Each value is written in its shortest fp16 repr (e.g. 0.0123) rather
+    than the ~20 characters of a float64, which keeps the query small.
+    """
+    values = np.asarray(embedding, dtype=np.float16).astype(str)
+    return '[' + ','.join(values) + ']'
+
+
+def _ef_search_for_k(k):
+    """HNSW search beam width for a top-k query (2*k clamped to 40-200)"""
+    return max(40, min(200, 2 * k))
+
+
+def _set_local_ef_search(cur, k):
+    """Widen hnsw.ef_search for a top-k query for this transaction only
+
+    The beam never drops below the database default that
+    index_chunk_embeds_with_hnsw stores for the table's size band, so a
+    small k on a large table still gets the banded recall.
+    """
+    cur.execute("""
+        SELECT set_config(
+            'hnsw.ef_search',
+            greatest(current_setting('hnsw.ef_search', true)::int, %s)::text,
+            true
+        )
+    """, (_ef_search_for_k(k),))
+
+
+def get_top_k_similar_docs(query_embedding, k, cols=DEFAULT_RESULT_COLUMNS):
     """ Query the labnetwork table for the top k similar posts
     
     Args:
         query_embedding (list): embedding of the query vector (currently 1536 d)
         k (int): number of similar posts to return
+        cols (tuple): columns to return, any of RESULT_COLUMNS; only the
+            ones displayed should be fetched
     Returns:
             top_k_docs (list): list of tuples of the top k similar posts
     """
-    try:
-        conn = connect_db()
-        with conn.cursor() as cur:
-            query = """
-                SELECT chunk_id, parent_type, parent_content, 
-                       name_of_tool, content
-                FROM chunk_embeds
-                ORDER BY embedding <=> %s
-                LIMIT %s
-            """
-            # === Must convert vector to array for pgvector to work ===
-            cur.execute(query, (np.array(query_embedding), k))
-            top_k_docs = cur.fetchall()
-        return top_k_docs
-    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-        print("Connection lost. Reconnecting...")
-        conn = connect_db()
-        return get_top_k_similar_docs(query_embedding, k, conn)
+    _check_result_columns(cols)
+    statement_name = _topk_statement_name(cols)
+    for attempt in range(3):
+        try:
+            with get_conn() as conn, conn.cursor() as cur:
+                # keep the planner on the ANN index scan for this transaction
+                cur.execute("SET LOCAL enable_bitmapscan = off")
+                _set_local_ef_search(cur, k)
+                _prepare(
+                    cur, statement_name, _topk_statement(statement_name, cols)
+                )
+                cur.execute(
+                    sql.SQL("EXECUTE {}(%s, %s)").format(
+                        sql.Identifier(statement_name)
+                    ),
+                    (_to_halfvec_literal(query_embedding), k),
+                )
+                top_k_docs = cur.fetchall()
+            return top_k_docs
+        except psycopg2.extensions.QueryCanceledError:
+            # a statement timeout or cancel, not a lost connection
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError):
+            # Neon drops idle connections when the compute suspends
+            if attempt == 2:
+                raise
+            print("Connection lost. Reconnecting...")
+            _close_idle_connections()
+            time.sleep(0.1 * 2 ** attempt)
+
+
+def _plan_nodes(plan):
+    """Yield every node of an EXPLAIN (FORMAT JSON) plan tree"""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def assert_uses_vector_index(conn, query, params):
+    """Raise RuntimeError unless query runs as an ANN index scan on embedding
+
+    Sequential scans are disabled while planning, so this checks that the
+    query is written in a form the index can serve (ORDER BY embedding <=> q
+    with the vector bound as a parameter), whatever the size of the table.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        if isinstance(query, str):
+            query = sql.SQL(query)
+        cur.execute(sql.SQL("EXPLAIN (FORMAT JSON) ") + query, params)
+        plan = cur.fetchone()[0][0]["Plan"]
+    for node in _plan_nodes(plan):
+        if (node.get("Node Type") in ("Index Scan", "Index Only Scan")
+                and "embedding" in node.get("Order By", "")):
+            return
+    raise RuntimeError(
+        f"Vector search does not use an index on embedding; plan: {plan}"
+    )
+
+
+def check_vector_index():
+    """Fail fast if the app's top-k search cannot use the ANN index
+
+    Checks that the embedding column has been migrated to halfvec, then
+    explains the prepared statement get_top_k_similar_docs runs, with a
+    random query vector.
+    """
+    statement_name = _topk_statement_name(DEFAULT_RESULT_COLUMNS)
+    dummy_vector = np.random.default_rng().standard_normal(1536)
+    with get_conn() as conn, conn.cursor() as cur:
+        _require_halfvec_column(cur)
+        _prepare(
+            cur, statement_name,
+            _topk_statement(statement_name, DEFAULT_RESULT_COLUMNS),
+        )
+        assert_uses_vector_index(
+            conn,
+            sql.SQL("EXECUTE {}(%s, %s)").format(sql.Identifier(statement_name)),
+            (_to_halfvec_literal(dummy_vector), 10),
+        )
+    print("top-k search uses the embedding index")
+
+
+def get_top_k_similar_docs_batch(query_embeddings, k,
+                                 cols=DEFAULT_RESULT_COLUMNS):
+    """ Query the chunk_embeds table for the top k chunks of many queries
+
+    All queries are searched in a single round trip by joining the array of
+    query vectors LATERAL against the k-NN search.
+
+    Args:
+        query_embeddings (list): embeddings of the query vectors (1536 d each)
+        k (int): number of similar chunks to return per query
+        cols (tuple): columns to return, any of RESULT_COLUMNS
+    Returns:
+        top_k_docs (list): one list of tuples per query, in input order
+    """
+    _check_result_columns(cols)
+    query = sql.SQL("""
+        SELECT queries.ord, {top_cols}
+        FROM unnest(%s::halfvec[]) WITH ORDINALITY AS queries(q, ord)
+        JOIN LATERAL (
+            SELECT {cols},
+                   embedding <=> queries.q AS distance
+            FROM chunk_embeds
+            ORDER BY embedding <=> queries.q
+            LIMIT %s
+        ) AS top ON TRUE
+        ORDER BY queries.ord, top.distance
+    """).format(
+        top_cols=sql.SQL(', ').join(sql.Identifier('top', col) for col in cols),
+        cols=sql.SQL(', ').join(map(sql.Identifier, cols)),
+    )
+    vectors = [_to_halfvec_literal(emb) for emb in query_embeddings]
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_bitmapscan = off")
+        _set_local_ef_search(cur, k)
+        cur.execute(query, (vectors, k))
+        rows = cur.fetchall()
+
+    top_k_docs = [[] for _ in range(len(vectors))]
+    for ord_, *doc in rows:
+        top_k_docs[ord_ - 1].append(tuple(doc))
+    return top_k_docs
 
 
 ########################################################################
@@ -82,8 +705,7 @@ def get_top_k_similar_docs(query_embedding, k):
 def list_tables():
     """List all tables in the database."""
     try:
-        conn = connect_db()
-        with conn.cursor() as cur:
+        with get_conn() as conn, conn.cursor() as cur:
             # Query to get all user tables (excluding system tables)
             cur.execute("""
                 SELECT table_name 
@@ -92,8 +714,7 @@ def list_tables():
                 ORDER BY table_name;
             """)
             tables = [table[0] for table in cur.fetchall()]
-            
-        conn.close()
+
         return tables
         
     except Exception as e:
@@ -112,8 +733,7 @@ def list_columns(table_name):
         list: List of column names in the table
     """
     try:
-        conn = connect_db()
-        with conn.cursor() as cur:
+        with get_conn() as conn, conn.cursor() as cur:
             cur.execute("""
                 SELECT column_name, data_type
                 FROM information_schema.columns
@@ -122,8 +742,7 @@ def list_columns(table_name):
                 ORDER BY ordinal_position;
             """, (table_name,))
             columns = [(col[0], col[1]) for col in cur.fetchall()]
-            
-        conn.close()
+
         return columns
         
     except Exception as e:
@@ -139,8 +758,7 @@ def get_tool_names():
         list: List of tool names from the database
     """
     try:
-        conn = connect_db()
-        with conn.cursor() as cur:
+        with get_conn() as conn, conn.cursor() as cur:
             query = """
                 SELECT tool_name 
                 FROM tool_table
@@ -149,10 +767,60 @@ def get_tool_names():
             cur.execute(query)
             # Convert list of tuples to simple list
             tool_names = [tool[0] for tool in cur.fetchall()]
-            
-        conn.close()
+
         return tool_names
         
     except Exception as e:
         print(f"Error getting tool names: {e}")
-        return []
\ No newline at end of file
+        return []
+
+# Columns of chunk_embeds that may be used for lookups; each has a btree index
+LOOKUP_COLUMNS = ('chunk_id', 'parent_type', 'name_of_tool')
+
+
+def create_lookup_indexes():
+    """Create btree indexes on the chunk_embeds lookup columns."""
+    with get_conn() as conn, conn.cursor() as cur:
+        for col_name in LOOKUP_COLUMNS:
+            cur.execute(
+                sql.SQL("CREATE INDEX IF NOT EXISTS {} ON chunk_embeds ({})").format(
+                    sql.Identifier(f"chunk_embeds_{col_name}_idx"),
+                    sql.Identifier(col_name),
+                )
+            )
+    print("chunk_embeds lookup indexes created")
+
+
+def get_items_from_column(col_name, value, limit=50):
+    """
+    Get the chunks whose col_name equals value.
+
+    Args:
+        col_name (str): column to filter on, one of LOOKUP_COLUMNS
+        value: value the column must match
+        limit (int): maximum number of rows to return
+
+    Returns:
+        list: List of (chunk_id, parent_type, parent_content, name_of_tool,
+            content) tuples
+    """
+    if col_name not in LOOKUP_COLUMNS:
+        raise ValueError(
+            f"Cannot look up chunks by {col_name!r}; use one of {LOOKUP_COLUMNS}"
+        )
+    query = sql.SQL("""
+        SELECT chunk_id, parent_type, parent_content, name_of_tool, content
+        FROM chunk_embeds
+        WHERE {} = %s
+        LIMIT %s
+    """).format(sql.Identifier(col_name))
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(query, (value, limit))
+            items = cur.fetchall()
+
+        return items
+
+    except Exception as e:
+        print(f"Error getting items from column {col_name}: {e}")
+        return []
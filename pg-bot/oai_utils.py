@@ -1,13 +1,157 @@
+import asyncio
+import functools
+import random
 import openai
-from config import EMBEDDING_MODEL, COMPLETION_MODEL
+from config import EMBEDDING_MODEL, COMPLETION_MODEL, EMBED_CACHE_PATH
+from embed_cache import EmbeddingCache
 
 
 client = openai.OpenAI()
+embed_cache = EmbeddingCache(EMBED_CACHE_PATH)
 
-def vectorize_data_with_openai(data):
-    """Takes in a string and returns a vectorized representation of the string."""
-    embed_response = client.embeddings.create(input=data, model=EMBEDDING_MODEL)
-    return embed_response.data[0].embedding
+
+def _embed_texts(texts, model):
+    """Embeds texts with a single API request, no caching"""
+    embed_response = client.embeddings.create(input=texts, model=model)
+    return _embeddings_in_order(embed_response)
+
+
+@functools.lru_cache(maxsize=1024)
+def _embed(text, model):
+    """Cached embedding lookup; a tuple so callers cannot mutate the cache"""
+    return tuple(embed_cache.embed_batch([text], model, _embed_texts)[0])
+
+
+def vectorize_data_with_openai(data, use_cache=True):
+    """Takes in a string and returns a vectorized representation of the string.
+
+    Repeat strings are served from an in-process cache backed by the on-disk
+    embedding cache instead of the API. Pass use_cache=False for sensitive
+    text that should not be stored.
+    """
+    if not use_cache:
+        return _embed_texts([data], EMBEDDING_MODEL)[0]
+    return list(_embed(data, EMBEDDING_MODEL))
+
+
+def _tile_texts(texts, batch_size, max_tokens):
+    """Split texts into consecutive batches within the per-request limits
+
+    Tokens are estimated as len(text) // 4, which is cheap and close enough
+    to stay under the API's token cap per request.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for text in texts:
+        tokens = len(text) // 4 + 1
+        if batch and (len(batch) == batch_size
+                      or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _embeddings_in_order(embed_response):
+    """Embeddings of a batch response, in the order of the inputs"""
+    return [
+        item.embedding
+        for item in sorted(embed_response.data, key=lambda item: item.index)
+    ]
+
+
+def vectorize_batch_with_openai(texts, batch_size=256, max_tokens=250_000,
+                                max_concurrency=1, use_cache=True):
+    """Takes a list of strings and returns their embeddings in the same order.
+
+    Many strings are sent per embeddings request instead of one request per
+    string, and only strings missing from the embedding cache are sent.
+    Surrounding whitespace is stripped, each distinct string is embedded
+    once, and blank strings (which the API rejects) are skipped. With
+    max_concurrency > 1 the requests are sent concurrently (use
+    vectorize_batches_async directly where an event loop is already running,
+    e.g. in a notebook).
+
+    Args:
+        texts (list): strings to embed
+        batch_size (int): maximum number of strings per request
+        max_tokens (int): maximum estimated tokens per request
+        max_concurrency (int): maximum number of requests in flight
+        use_cache (bool): read and write the embedding cache
+    Returns:
+        embeddings (list): one embedding (list of floats) per input string,
+            or None where the string was blank
+    """
+    cleaned = ['' if text is None else str(text).strip() for text in texts]
+    unique_texts = list(dict.fromkeys(text for text in cleaned if text))
+
+    def embed_uncached(texts, model):
+        batches = _tile_texts(texts, batch_size, max_tokens)
+        if max_concurrency > 1:
+            batch_embeddings = asyncio.run(
+                vectorize_batches_async(batches, max_concurrency, model)
+            )
+        else:
+            batch_embeddings = [_embed_texts(batch, model) for batch in batches]
+        return [embedding for batch in batch_embeddings for embedding in batch]
+
+    if use_cache:
+        unique_embeddings = embed_cache.embed_batch(
+            unique_texts, EMBEDDING_MODEL, embed_uncached
+        )
+    else:
+        unique_embeddings = embed_uncached(unique_texts, EMBEDDING_MODEL)
+    # fan each embedding back out to every position holding that text
+    by_text = dict(zip(unique_texts, unique_embeddings))
+    return [by_text.get(text) for text in cleaned]
+
+
+async def _embed_batch_async(async_client, semaphore, batch, model,
+                             max_retries=5):
+    """Embed one batch, backing off exponentially while rate limited"""
+    async with semaphore:
+        for attempt in range(max_retries):
+            try:
+                embed_response = await async_client.embeddings.create(
+                    input=batch, model=model
+                )
+                return _embeddings_in_order(embed_response)
+            except openai.RateLimitError:
+                if attempt == max_retries - 1:
+                    raise
+                await asyncio.sleep(2 ** attempt + random.random())
+
+
+async def vectorize_batches_async(batches, max_concurrency=8,
+                                  model=EMBEDDING_MODEL):
+    """Embed batches of strings concurrently, at most max_concurrency at once
+
+    Args:
+        batches (list): lists of strings, each sent as one request
+        max_concurrency (int): maximum number of requests in flight
+        model (str): embedding model to request
+    Returns:
+        embeddings (list): one list of embeddings per batch, in input order
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    async with openai.AsyncOpenAI() as async_client:
+        return await asyncio.gather(*(
+            _embed_batch_async(async_client, semaphore, batch, model)
+            for batch in batches
+        ))
+
+
+async def vectorize_async(data, use_cache=True):
+    """Async version of vectorize_data_with_openai for use with asyncio.gather
+
+    Runs the synchronous lookup in a worker thread, so a repeat string is
+    still served from the in-process cache (then the on-disk cache) before
+    any API request is made.
+    """
+    return await asyncio.to_thread(vectorize_data_with_openai, data, use_cache)
 
 
 def get_completion_from_messages(
@@ -23,35 +167,39 @@ def get_completion_from_messages(
     return response.choices[0].message.content
 
 
+# Static parts of the retrieval system message, built once at import
+_SYS_PREFIX = (
+    "You are an engineer with expertise in complex tools. "
+    "You will receive a text of data retrieved from a nanofab tool manual.\n"
+    "Base your answers to the user prompt only on the retrieved data below:\n"
+    "\n"
+    "#### Retrieved tool manual data ####\n"
+)
+_SYS_SUFFIX = (
+    "\n\n"
+    "Formulate a response that best matches the user's query,\n"
+    "Give the response with as much relevant detail as possible\n"
+    "Do not preface or end the response with extra polite words.\n"
+    "Just answer the question with the facts. Format the response as the\n"
+    "user would like to see it if specified.\n"
+    "\n"
+    "Do not answer questions that are not relevant to the data that is retrieved.\n"
+    "If the retrieved texts do not contain any information to be able\n"
+    "to answer the user query, you must reply that you do not have the\n"
+    "necessary information, and that the user should ask a relevant tool related\n"
+    "question.\n"
+)
+
+
 def get_system_message_for_vector_retrievals(retrieved_texts):
     """Returns a system message with the retrieved data embedded
 
     Args:
         retrieved_data: (markdown data with a single chunk separated by a line
-        retrieved for a nanofab tool manual
+        retrieved for a nanofab tool manual, or a list of retrieved rows
     Returns:
         system_message: (str) formatted string with the retrieved data included
     """
-
-    system_message = f"""
-        You are an engineer with expertise in complex tools.Y
-        ou will receive a text of data retrieved from a nanofab tool manual.
-        Base your answers to the user prompt only on the retrieved data below:
-        
-        #### Retrieved tool manual data ####
-        {retrieved_texts}
-
-        Formulate a response that best matches the user's query, 
-        Give the response with as much relevant detail as possible
-        Do not preface or end the response with extra polite words. 
-        Just answer the question with the facts. Format the response as the 
-        user would like to see it if specified.  
-        
-        Do not answer questions that are not relevant to the data that is retrieved.
-        If the retrieved texts do not contain any information to be able
-        to answer the user query, you must reply that you do not have the 
-        necessary information, and that the user should ask a relevant tool related
-        question.  
-        
-        """
-    return system_message
+    if not isinstance(retrieved_texts, str):
+        retrieved_texts = "\n".join(str(text) for text in retrieved_texts)
+    return "".join((_SYS_PREFIX, retrieved_texts, _SYS_SUFFIX))
@@ -2,13 +2,14 @@ import streamlit as st
 import openai
 import oai_utils as oai
 import st_utils
-import neondb as neon
 from config import OPENAI_API_KEY
 
 
 # Set OpenAI and Weaviate API keys
 openai.api_key = OPENAI_API_KEY
 
+# fail fast if the vector search would fall back to a sequential scan
+st_utils.check_vector_index()
 
 
 st.title(":high_brightness: PG-bot")
@@ -22,7 +23,7 @@ with st.sidebar:
     
     if st.button('Clear message history'):
         st_utils.clear_messages()
-    MANUALS = neon.get_tool_names()
+    MANUALS = st_utils.get_tool_names_cached()
     selected_manual = st.sidebar.selectbox('Select a Manual', MANUALS)
     # gets the manual link from the google doc
     # url = neon.get_tenant_info_from_df('url_link', selected_manual)
@@ -69,8 +70,7 @@ if user_message is not None and user_message.strip() != "":
         st.markdown(user_message)
     with st.spinner('Retriving results ...'):
         try:
-            vector = oai.vectorize_data_with_openai(user_message)
-            retrieved_data = neon.get_top_k_similar_docs(vector, k)
+            retrieved_data = st_utils.retrieve(user_message, k)
             retrieved_texts = st_utils.format_retrieved_chunks(retrieved_data)
             
             system_message = oai.get_system_message_for_vector_retrievals(retrieved_texts)
@@ -0,0 +1,76 @@
+# File: semantic_cache.py
+#
+# Description:
+# ------------------------------------------------------------
+# An in-process cache of retrieval results keyed by query embedding. A new
+# query whose embedding is nearly identical (cosine similarity above the
+# threshold) to one seen recently gets the stored result, so rephrased
+# repeats of a question skip the vector search.
+
+
+import threading
+import time
+import numpy as np
+
+
+class SemanticCache:
+    """Nearest-neighbour cache of results, kept separately per namespace
+
+    Args:
+        threshold (float): minimum cosine similarity counted as a hit
+        ttl (float): seconds an entry stays valid
+        max_entries (int): entries kept per namespace, oldest dropped first
+    """
+
+    def __init__(self, threshold=0.97, ttl=600, max_entries=1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # namespace -> (unit vectors matrix, results list, timestamps list)
+        self._entries = {}
+
+    def _prune(self, namespace):
+        """Drop expired and excess entries of a namespace"""
+        vectors, results, stamps = self._entries[namespace]
+        cutoff = time.time() - self.ttl
+        keep = [i for i, stamp in enumerate(stamps) if stamp >= cutoff]
+        keep = keep[-self.max_entries:]
+        self._entries[namespace] = (
+            vectors[keep],
+            [results[i] for i in keep],
+            [stamps[i] for i in keep],
+        )
+
+    def lookup(self, namespace, embedding):
+        """Stored result of the most similar recent query, or None"""
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / np.linalg.norm(query)
+        with self._lock:
+            if namespace not in self._entries:
+                return None
+            self._prune(namespace)
+            vectors, results, _ = self._entries[namespace]
+            if not results:
+                return None
+            # rows are unit vectors, so the dot product is the cosine
+            similarities = vectors @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            return results[best]
+
+    def insert(self, namespace, embedding, result):
+        """Remember the result of a query in the given namespace"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / np.linalg.norm(vector)
+        with self._lock:
+            if namespace in self._entries:
+                vectors, results, stamps = self._entries[namespace]
+                vectors = np.vstack((vectors, vector))
+            else:
+                vectors, results, stamps = vector[np.newaxis, :], [], []
+            self._entries[namespace] = (
+                vectors, results + [result], stamps + [time.time()]
+            )
+            self._prune(namespace)
@@ -1,4 +1,53 @@
+import asyncio
 import streamlit as st
+import neondb as neon
+import oai_utils as oai
+from semantic_cache import SemanticCache
+
+# near-duplicate questions reuse the chunks retrieved for the earlier one
+semantic_cache = SemanticCache(threshold=0.97, ttl=600)
+
+@st.cache_data(ttl=300)
+def _get_tool_names():
+    return neon.get_tool_names()
+
+def get_tool_names_cached():
+    """Tool names for the sidebar, re-read from the database every 5 minutes"""
+    tool_names = _get_tool_names()
+    if not tool_names:
+        # get_tool_names returns [] on error; retry on the next rerun
+        _get_tool_names.clear()
+    return tool_names
+
+@st.cache_resource(show_spinner=False)
+def check_vector_index():
+    """Checks once per server process that the top-k search uses the index"""
+    neon.check_vector_index()
+
+async def _embed_and_warm_connection(text):
+    vector, _ = await asyncio.gather(
+        oai.vectorize_async(text),
+        asyncio.to_thread(neon.ensure_connection),
+    )
+    return vector
+
+def vectorize_and_connect(text):
+    """Embeds the text while a database connection is opened in parallel"""
+    return asyncio.run(_embed_and_warm_connection(text))
+
+@st.cache_data(ttl=600, show_spinner=False)
+def retrieve(user_message, k):
+    """Top-k chunks for a message, memoized so reruns skip OpenAI and Neon
+
+    Rephrasings of a recent question are answered from the semantic cache
+    without another vector search.
+    """
+    vector = vectorize_and_connect(user_message)
+    retrieved_data = semantic_cache.lookup(k, vector)
+    if retrieved_data is None:
+        retrieved_data = neon.get_top_k_similar_docs(vector, k)
+        semantic_cache.insert(k, vector, retrieved_data)
+    return retrieved_data
 
 def clear_messages():
     """Clears the messages and history"""